@@ -0,0 +1,88 @@
+import io
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Headless backend for chart worker processes
+import matplotlib.pyplot as plt
+
+# Chart rendering lives in its own module so spawned workers can import render_chart;
+# Streamlit replaces __main__ on every rerun, so functions defined in the script can't be pickled
+
+# Reusable figure for chart rendering, created once per worker process
+_chart_figure = None
+
+# Function to get the worker's figure with its axes cleared for the next chart
+def get_chart_axes():
+    global _chart_figure
+    if _chart_figure is None:
+        _chart_figure, _ = plt.subplots(figsize=(8, 5))
+    ax = _chart_figure.axes[0]
+    ax.clear()
+    return _chart_figure, ax
+
+# Function to bin x into 3 equal-width intervals like pd.cut(bins=3), dropping rows with missing values
+def bin_into_thirds(x, y):
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if x.size == 0:
+        return np.zeros(0, dtype=np.intp), y, ["No data"] * 3  # Empty bins, drawn as an empty chart
+    lo, hi = x.min(), x.max()
+    if lo == hi:
+        # Constant column: widen the range by 0.1% like pd.cut, so every row lands in the middle bin
+        margin = 0.001 * abs(lo) if lo != 0 else 0.001
+        lo, hi = lo - margin, hi + margin
+    edges = np.linspace(lo, hi, 4)
+    idx = np.digitize(x, edges[1:-1], right=True)
+    precision = 2
+    while len(set(np.round(edges, precision))) < 4:  # Narrow bins need more decimals to tell their edges apart
+        precision += 1
+    labels = [f"({edges[i]:.{precision}f}, {edges[i + 1]:.{precision}f}]" for i in range(3)]
+    return idx, y, labels
+
+# Function to render one comparison chart to PNG bytes (runs in a worker process)
+def render_chart(df, col, other_col, plot_type, is_numeric_col, is_numeric_other):
+    fig, ax = get_chart_axes()
+    colorbar = None
+    
+    if is_numeric_col and is_numeric_other:
+        if plot_type == "Scatter":
+            df.plot.scatter(x=col, y=other_col, color='teal', alpha=0.5, ax=ax)
+            ax.set_title(f"{col} vs {other_col}", fontsize=12)
+        elif plot_type == "Hexbin":
+            hexbin = ax.hexbin(df[col], df[other_col], gridsize=20, cmap='Blues', mincnt=1)
+            colorbar = fig.colorbar(hexbin, ax=ax, label='Count')
+            ax.set_title(f"{col} vs {other_col}", fontsize=12)
+        elif plot_type in ("Box", "Bar"):
+            x = df[col].to_numpy(dtype=float, na_value=np.nan)
+            y = df[other_col].to_numpy(dtype=float, na_value=np.nan)
+            idx, y, labels = bin_into_thirds(x, y)
+            counts = np.bincount(idx, minlength=3)
+            if plot_type == "Box":
+                groups = np.split(y[np.argsort(idx, kind='stable')], np.cumsum(counts)[:-1])
+                ax.boxplot(groups, patch_artist=True)
+                ax.set_xticks(range(1, 4), labels)
+                ax.set_title(f"{other_col} by {col}", fontsize=12)
+            else:
+                sums = np.bincount(idx, weights=y, minlength=3)
+                means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+                ax.bar(range(3), means, color='lightcoral')
+                ax.set_xticks(range(3), labels)
+                ax.set_title(f"Mean {other_col} by {col}", fontsize=12)
+    elif is_numeric_other:
+        df.groupby(col)[other_col].mean().plot(kind='bar', color='lightgreen', ax=ax)
+        ax.set_title(f"Mean {other_col} by {col}", fontsize=12)
+    elif is_numeric_col:
+        df.groupby(other_col)[col].count().plot(kind='bar', color='lightblue', ax=ax)
+        ax.set_title(f"Count of {col} by {other_col}", fontsize=12)
+    else:
+        pd.crosstab(df[col], df[other_col]).plot(kind='bar', stacked=True, colormap='Set2', ax=ax)
+        ax.set_title(f"{col} vs {other_col}", fontsize=12)
+    
+    ax.set_xlabel(col, fontsize=10)
+    ax.set_ylabel(other_col, fontsize=10)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=8)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=80)  # Embedded at 8in x 5in, so 80 dpi is enough
+    if colorbar is not None:
+        colorbar.remove()  # Restores the axes' original size for the next chart
+    return buf.getvalue()
@@ -1,26 +1,182 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
-import subprocess
 import os
 import streamlit as st
 import ollama
-import tempfile
-import random
+import io
+import collections
+import shelve
+import hashlib
+import json
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import charts
 
 # Run this script with: streamlit run ppt_generator.py
 # Do not run directly with python ppt_generator.py to avoid 'missing ScriptRunContext' warnings.
 
+# LLaMA settings shared by every call; keep_alive keeps the model and its prompt cache loaded between calls
+LLM_MODEL = "llama3.2"
+EMBED_MODEL = "nomic-embed-text"
+LLM_OPTIONS = {"num_ctx": 4096, "temperature": 0.3}
+LLM_KEEP_ALIVE = "15m"
+TOKENS_PER_BULLET_SECTION = 250  # Output budget for 5 to 6 sentences, including JSON punctuation
+
+# Persistent semantic cache for LLaMA responses, shared across runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ppt_gen")
+CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity needed to reuse a cached response
+CACHE_MAX_ENTRIES = 1000  # Oldest responses are evicted beyond this
+
+# Function to open the on-disk response cache
+def open_cache_db():
+    return shelve.open(os.path.join(CACHE_DIR, "responses"))
+
+# Function to get the server-wide response cache, loaded from disk once and kept across Streamlit reruns and sessions
+# (on_disk is cleared when the cache cannot be read or written; responses are then cached in memory only)
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    cache = {'lock': threading.Lock(), 'entries': collections.OrderedDict(), 'on_disk': True}  # LLaMA calls run on worker threads
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open_cache_db() as db:
+            cache['entries'].update(db.items())
+            while len(cache['entries']) > CACHE_MAX_ENTRIES:
+                del db[cache['entries'].popitem(last=False)[0]]
+    except Exception:
+        cache['on_disk'] = False
+    return cache
+
+# Function to build the exact cache key of a prompt within its scope
+def response_key(prompt, cache_key):
+    return hashlib.sha256(f"{cache_key}:{prompt}".encode()).hexdigest()
+
+# Function to embed a prompt (normalized so dot product equals cosine similarity)
+def embed_prompt(prompt):
+    try:
+        embedding = np.asarray(ollama.embeddings(model=EMBED_MODEL, prompt=prompt, keep_alive=LLM_KEEP_ALIVE)['embedding'], dtype=float)
+        return embedding / np.linalg.norm(embedding)
+    except Exception:
+        return None
+
+# Function to find the cached response of exactly this prompt, without embedding it
+def find_exact_response(key):
+    cache = get_response_cache()
+    with cache['lock']:
+        entry = cache['entries'].get(key)
+    return entry['response'] if entry is not None else None
+
+# Function to find the cached response of the most similar earlier prompt with the same exact key
+def find_cached_response(embedding, cache_key):
+    cache = get_response_cache()
+    with cache['lock']:
+        entries = [entry for entry in cache['entries'].values() if entry.get('key') == cache_key and entry.get('embedding') is not None]
+    if not entries:
+        return None
+    scores = np.array([entry['embedding'] for entry in entries]) @ embedding
+    best = int(np.argmax(scores))
+    return entries[best]['response'] if scores[best] >= CACHE_SIMILARITY_THRESHOLD else None
+
+# Function to persist a new prompt/response pair, evicting the oldest entries beyond CACHE_MAX_ENTRIES
+# (kept in memory only if the disk write fails; entries without an embedding still serve exact matches)
+def store_cached_response(key, embedding, response, cache_key):
+    cache = get_response_cache()
+    entry = {'embedding': embedding, 'response': response, 'key': cache_key}
+    with cache['lock']:
+        entries = cache['entries']
+        entries[key] = entry
+        entries.move_to_end(key)
+        evicted = [entries.popitem(last=False)[0] for _ in range(len(entries) - CACHE_MAX_ENTRIES)]
+        if cache['on_disk']:
+            try:
+                with open_cache_db() as db:
+                    db[key] = entry
+                    for old_key in evicted:
+                        db.pop(old_key, None)
+            except Exception:
+                cache['on_disk'] = False
+
+# Function to size one context window for a whole report from its largest (prompt, output_tokens) call
+# (about 3 characters per token; Ollama reloads the model whenever num_ctx changes, so every call in a report shares it)
+def context_size(calls):
+    needed_tokens = max(len(prompt) // 3 + output_tokens for prompt, output_tokens in calls)
+    return max(LLM_OPTIONS["num_ctx"], -(-needed_tokens // 1024) * 1024)  # Rounded up to a multiple of 1024
+
+# Function to build the options for one call with the report's context window and its own output budget
+def llm_options(num_ctx, output_tokens):
+    return {**LLM_OPTIONS, "num_ctx": num_ctx, "num_predict": output_tokens}
+
+# Function to stream a bullet-point response, stopping as soon as max_points complete lines have arrived
+def stream_llama_bullets(prompt, max_points, num_ctx):
+    options = {**llm_options(num_ctx, 40 * max_points), "stop": [f"\n{max_points + 1}."]}
+    text = ""
+    for chunk in ollama.generate(model=LLM_MODEL, prompt=prompt, stream=True, options=options, keep_alive=LLM_KEEP_ALIVE):
+        text += chunk['response']
+        complete_lines = [line for line in text.split('\n')[:-1] if line.strip()]
+        if len(complete_lines) >= max_points:
+            break  # Closing the stream stops generation on the server
+    return text.strip()
+
+# Function to reject unusable responses (invalid JSON or too few bullet points) before they are cached
+def validate_response(response, fmt, min_points):
+    if fmt == "json":
+        if not isinstance(json.loads(response), dict):
+            raise ValueError("LLaMA returned JSON that is not an object.")
+    elif min_points and len([line for line in response.split('\n') if line.strip()]) < min_points:
+        raise ValueError(f"LLaMA returned fewer than {min_points} bullet points.")
+
+# Function to query LLaMA, reusing responses for semantically similar prompts
+# cache_scope identifies the data, column and request; only prompts with the same scope may share a response
+# (identical prompts hit the exact key without an embedding call; failures and invalid responses raise and are not cached)
+def query_llama(prompt, cache_scope, num_ctx, fmt="", min_points=None, max_points=None, output_tokens=TOKENS_PER_BULLET_SECTION):
+    cache_key = f"{fmt}|{max_points}|{cache_scope}"
+    key = response_key(prompt, cache_key)
+    cached = find_exact_response(key)
+    if cached is not None:
+        return cached
+    embedding = embed_prompt(prompt)  # Only embedded on an exact miss
+    if embedding is not None:
+        cached = find_cached_response(embedding, cache_key)
+        if cached is not None:
+            return cached
+    if max_points:
+        response = stream_llama_bullets(prompt, max_points, num_ctx)
+    else:
+        response = ollama.generate(model=LLM_MODEL, prompt=prompt, format=fmt, options=llm_options(num_ctx, output_tokens), keep_alive=LLM_KEEP_ALIVE)['response'].strip()
+    validate_response(response, fmt, min_points)
+    store_cached_response(key, embedding, response, cache_key)
+    return response
+
 # Function to interact with LLaMA with CSV-specific content
-def generate_with_llama(prompt):
+# (partial_ok accepts a response with fewer than min_points lines; the caller fills in the missing points)
+def generate_with_llama(prompt, cache_scope, num_ctx, min_points=5, max_points=6, partial_ok=False):
     try:
-        response = ollama.generate(model="llama3.2", prompt=f"{prompt} Provide only the concise, complete text or numbered list (no introductory phrases, no formatting). Ensure 5 to 6 complete bullet points ending with full sentences, derived solely from the provided CSV data analysis.")
-        return response['response'].strip()
+        return query_llama(f"{prompt} Provide only the concise, complete text or numbered list (no introductory phrases, no formatting). Ensure {min_points} to {max_points} complete bullet points ending with full sentences, derived solely from the provided CSV data analysis.", cache_scope, num_ctx, min_points=1 if partial_ok else min_points, max_points=max_points)
     except Exception:
         return "Analysis failed due to error.\nCSV data could not be processed.\nPlease verify file integrity.\nContact support for assistance.\nThis is an error state."
 
+# Function to request several report sections from LLaMA in a single JSON response
+def generate_json_with_llama(prompt, cache_scope, num_ctx, output_tokens):
+    try:
+        sections = json.loads(query_llama(prompt, cache_scope, num_ctx, fmt="json", output_tokens=output_tokens))
+        return sections if isinstance(sections, dict) else {}
+    except Exception:
+        return {}
+
+# Function to turn a JSON section (list or text) into 5 to 6 bullet points,
+# asking LLaMA for that section alone when the batched response is missing or too short
+def section_to_bullets(section, fallback_prompt, cache_scope, num_ctx):
+    if isinstance(section, list):
+        section = "\n".join(str(point) for point in section)
+    text = section if isinstance(section, str) else ""
+    if len([line for line in text.split('\n') if line.strip()]) < 5:
+        text = generate_with_llama(fallback_prompt, cache_scope, num_ctx)
+    return split_into_bullets(text)
+
 # Function to split text into 5 to 6 bullet points
 def split_into_bullets(text, min_points=5, max_points=6):
     lines = [line.strip() for line in text.split('\n') if line.strip()]
@@ -32,29 +188,46 @@ def split_into_bullets(text, min_points=5, max_points=6):
             "No insights can be derived.",
             "This is an error message."
         ]
-    num_points = random.randint(min_points, min(max_points, len(lines)))
-    return lines[:num_points]
+    return lines[:max_points]
 
-# Function to add a slide with adjusted layout
-def add_slide(prs, title, content=None, chart_path=None, bg_color=RGBColor(240, 240, 240)):
-    slide_layout = prs.slide_layouts[5] if chart_path else prs.slide_layouts[1]
+# Slide colors shared by every slide
+BG_COLOR = RGBColor(240, 240, 240)
+COVER_BG_COLOR = RGBColor(240, 248, 255)
+TITLE_COLOR = RGBColor(0, 51, 102)
+BODY_COLOR = RGBColor(51, 51, 51)
+
+# Function to look up the report's slide layouts once per presentation
+def get_slide_layouts(prs):
+    return {'content': prs.slide_layouts[1], 'title_only': prs.slide_layouts[5]}
+
+# Function to add a slide with a solid background and a styled title
+def add_titled_slide(prs, slide_layout, title, bg_color, top):
     slide = prs.slides.add_slide(slide_layout)
     slide.background.fill.solid()
     slide.background.fill.fore_color.rgb = bg_color
-    
-    # Title
     title_shape = slide.shapes.title
     title_shape.text = title
     title_shape.text_frame.paragraphs[0].font.size = Pt(32)
-    title_shape.text_frame.paragraphs[0].font.color.rgb = RGBColor(0, 51, 102)
-    title_shape.top = Inches(0.5)
+    title_shape.text_frame.paragraphs[0].font.color.rgb = TITLE_COLOR
+    title_shape.top = top
     title_shape.left = Inches(1)
     title_shape.width = Inches(8)
+    return slide, title_shape
+
+# Function to add a title-only slide (cover and Thank You); the Title Only layout has no other placeholders to remove
+def add_title_slide(prs, layouts, title):
+    slide, _ = add_titled_slide(prs, layouts['title_only'], title, COVER_BG_COLOR, Inches(3))
+    return slide
+
+# Function to add a slide with adjusted layout
+def add_slide(prs, layouts, title, content=None, chart_stream=None, bg_color=BG_COLOR):
+    slide_layout = layouts['title_only'] if chart_stream else layouts['content']
+    slide, title_shape = add_titled_slide(prs, slide_layout, title, bg_color, Inches(0.5))
     title_shape.height = Inches(1)
     
     # Content or plot
-    if chart_path:
-        slide.shapes.add_picture(chart_path, Inches(1), Inches(1.75), Inches(8), Inches(5))
+    if chart_stream:
+        slide.shapes.add_picture(chart_stream, Inches(1), Inches(1.75), Inches(8), Inches(5))
     elif content:
         textbox_height = Inches(6)
         font_size = Pt(14)
@@ -64,47 +237,89 @@ def add_slide(prs, title, content=None, chart_path=None, bg_color=RGBColor(240,
             p = tf.add_paragraph()
             p.text = point
             p.font.size = font_size
-            p.font.color.rgb = RGBColor(51, 51, 51)
+            p.font.color.rgb = BODY_COLOR
             p.level = 0
             p.space_after = Pt(6)
     return slide
 
+# Scatter and Box charts draw every row; larger CSVs are plotted from a sample of this size
+PLOT_SAMPLE_ROWS = 20000
+
 # Backend EDA and slide generation
-def generate_eda_report(csv_file, col, plot_type, min_slides, user_prompt):
-    csv_file.seek(0)
-    try:
-        df = pd.read_csv(csv_file)
-        if df.empty:
-            return False, "CSV file is empty."
-    except Exception as e:
-        return False, f"Error reading CSV: {str(e)}"
+def generate_eda_report(df, col, plot_type, min_slides, user_prompt):
+    if df.empty:
+        return False, "CSV file is empty."
     
     num_cols = len(df.columns)
     other_cols = [c for c in df.columns if c != col]
     prs = Presentation()
     prs.slide_width = Inches(10)
     prs.slide_height = Inches(7.5)
+    layouts = get_slide_layouts(prs)
     
-    # First slide: Only title
-    title_prompt = f"Analyze CSV: Rows={len(df)}, Cols={num_cols}, Selected={col}. Generate a 5-word title based on data and '{user_prompt}'."
-    cover_title = generate_with_llama(title_prompt).split('\n')[0]
-    title_slide_layout = prs.slide_layouts[0]
-    slide = prs.slides.add_slide(title_slide_layout)
-    slide.background.fill.solid()
-    slide.background.fill.fore_color.rgb = RGBColor(240, 248, 255)
-    title = slide.shapes.title
-    title.text = cover_title
-    title.text_frame.paragraphs[0].font.size = Pt(32)
-    title.text_frame.paragraphs[0].font.color.rgb = RGBColor(0, 51, 102)
-    title.top = Inches(3)
-    title.left = Inches(1)
-    title.width = Inches(8)
-    for shape in slide.shapes:
-        if shape.placeholder_format.idx != 0:
-            shape.element.getparent().remove(shape.element)
-    slide_titles = [cover_title]
+    # Shared CSV context, placed verbatim at the start of every prompt so Ollama reuses its cached prefix
+    csv_context = (
+        f"CSV data: {len(df)} rows, {num_cols} columns, selected column: {col}.\n"
+        f"Column types: {', '.join(f'{c}={t}' for c, t in df.dtypes.items())}.\n"
+        f"Summary statistics:\n{df.describe().round(2).to_string()}"
+    )
     
-    # Second slide(s): Overview of upcoming slides
+    # Exact part of the LLaMA cache key: responses are only shared between prompts for the same data, column and request
+    cache_scope = json.dumps([str(col), user_prompt, hashlib.sha256(csv_context.encode()).hexdigest()])
+    
+    # Precompute column statistics once instead of re-scanning columns for every comparison
+    numeric_mask = df.dtypes.apply(pd.api.types.is_numeric_dtype)
+    is_numeric_col = bool(numeric_mask[col])
+    numeric_cols = list(df.columns[numeric_mask.to_numpy()])
+    numeric_stats = df[numeric_cols].agg(['mean', 'min', 'max'])
+    nuniques = df.nunique()
+    modes = {}
+    for c in df.columns[~numeric_mask.to_numpy()]:
+        mode = df[c].mode()
+        modes[c] = mode.iat[0] if len(mode) else "N/A"  # Columns with no values have no mode
+    corrs = df[numeric_cols].corrwith(df[col]) if is_numeric_col else None
+    
+    # CSV-specific stats for every comparison
+    comparison_stats = {}
+    for other_col in other_cols:
+        is_numeric_other = bool(numeric_mask[other_col])
+        corr = corrs[other_col] if is_numeric_col and is_numeric_other else "N/A"
+        col_stat_label = "mean" if is_numeric_col else "unique"
+        col_stat_value = f"{numeric_stats.at['mean', col]:.2f}" if is_numeric_col else str(nuniques[col])
+        other_col_stat_label = "mean" if is_numeric_other else "unique"
+        other_col_stat_value = f"{numeric_stats.at['mean', other_col]:.2f}" if is_numeric_other else str(nuniques[other_col])
+        stats_content = f"{col} vs {other_col}: Corr={corr if corr != 'N/A' else 'N/A'}, {col} {col_stat_label}={col_stat_value}, {other_col} {other_col_stat_label}={other_col_stat_value}"
+        content_points = [
+            f"Rows analyzed: {len(df)}. Total entries in CSV.",
+            f"Correlation: {corr:.2f}. Shows {col} vs {other_col} link." if corr != "N/A" else f"{col} type: {df[col].dtype}. Non-numeric data detected.",
+            f"{other_col} mean: {numeric_stats.at['mean', other_col]:.2f}. Average from CSV data." if is_numeric_other else f"{other_col} unique: {nuniques[other_col]}. Distinct values counted.",
+            f"{other_col} min: {numeric_stats.at['min', other_col]:.2f}. Minimum value in CSV." if is_numeric_other else f"{other_col} top: {modes[other_col]}. Most frequent in CSV.",
+            f"{other_col} max: {numeric_stats.at['max', other_col]:.2f}. Maximum value in CSV." if is_numeric_other else f"{other_col} diversity: {'High' if nuniques[other_col] > 5 else 'Low'}. Variation in data.",
+            f"{col} stat: {numeric_stats.at['mean', col]:.2f}. Numeric average from CSV." if is_numeric_col else f"{col} top: {modes[col]}. Top category in CSV."
+        ]
+        comparison_stats[other_col] = (stats_content, content_points)
+    
+    # Request title, introduction, detailed insights, summary and conclusion in one LLM call
+    include_summary = bool(user_prompt) and user_prompt.lower() != "default analysis of one column vs others" and "summary" in user_prompt.lower()
+    bullet_instruction = "a list of 5 to 6 complete sentences derived solely from the provided CSV data analysis"
+    report_schema = {
+        "title": "a 5-word title based on the data",
+        "intro": f"{bullet_instruction}, introducing the analysis of {col} vs others",
+        "details": {str(other_col): f"{bullet_instruction}, giving detailed insights for {col} vs {other_col}" for other_col in other_cols},
+        "conclusion": f"{bullet_instruction}, concluding the analysis of {col} vs others"
+    }
+    if include_summary:
+        report_schema["summary"] = f"{bullet_instruction}, summarizing the analysis of {col} vs others"
+    report_prompt = (
+        f"{csv_context}\n\nTASK: Analyze {col} vs others based on '{user_prompt}'. "
+        f"Comparison stats: {'; '.join(stats_content for stats_content, _ in comparison_stats.values())}. "
+        f"Return JSON with exactly these keys: {json.dumps(report_schema)}"
+    )
+    report_scope = json.dumps([cache_scope, sorted(report_schema), sorted(report_schema["details"])])
+    report_tokens = 50 + TOKENS_PER_BULLET_SECTION * (len(report_schema) - 2 + len(other_cols))  # Title plus every bullet section
+    
+    # Slide titles for the overview (cover title is filled in once LLaMA responds)
+    slide_titles = [None]
     slide_titles.extend(["Introduction to Analysis"])
     slide_titles.extend([f"Comparison Plot: {col} vs {other_col}" for other_col in other_cols])
     slide_titles.extend([f"Comparison Insights: {col} vs {other_col}" for other_col in other_cols])
@@ -112,168 +327,173 @@ def generate_eda_report(csv_file, col, plot_type, min_slides, user_prompt):
     extra_slides_needed = min_slides > (2 * num_cols)  # Define here for later use
     if extra_slides_needed:
         slide_titles.extend(["Index of Slides"])
-    if user_prompt.lower() != "default analysis of one column vs others" and "summary" in user_prompt.lower():
+    if include_summary:
         slide_titles.append("Summary of Findings")
     slide_titles.append("Conclusion of Analysis")
+    
+    # Ensure minimum slides by adding extra content slides if needed
+    current_slides = len(slide_titles) + int(include_summary) + 1  # Summary is counted again once added, +1 for Thank You
+    extra_slide_count = max(0, min_slides - current_slides)
+    extra_prompt = f"{csv_context}\n\nTASK: Provide extra analysis for {col} vs others based on '{user_prompt}'."
+    # One context window for every call in this report (the fallback prompts are shorter than the batched one)
+    num_ctx = context_size([(report_prompt, report_tokens), (extra_prompt, 40 * 6 * extra_slide_count)])
+    
+    # Chart data per comparison; Hexbin and Bar charts aggregate, so only point plots use the sample
+    plot_sample = df if len(df) <= PLOT_SAMPLE_ROWS else df.sample(n=PLOT_SAMPLE_ROWS, random_state=0)
+    chart_frames = []
+    for other_col in other_cols:
+        draws_points = plot_type in ("Scatter", "Box") and is_numeric_col and numeric_mask[other_col]
+        frame = plot_sample if draws_points else df
+        chart_frames.append(pd.DataFrame({col: frame[col], other_col: frame[other_col]}, copy=False))  # Column views, not a copied slice
+    
+    # Run LLaMA calls on threads while charts render on worker processes
+    with ThreadPoolExecutor() as llm_pool:
+        report_future = llm_pool.submit(generate_json_with_llama, report_prompt, report_scope, num_ctx, report_tokens)
+        # One request covers every extra slide: 5 to 6 bullet points per slide
+        extra_future = llm_pool.submit(generate_with_llama, extra_prompt, json.dumps([cache_scope, "extra"]), num_ctx, 5 * extra_slide_count, 6 * extra_slide_count, partial_ok=True) if extra_slide_count else None
+        chart_jobs = [
+            (chart_df, col, other_col, plot_type, is_numeric_col, bool(numeric_mask[other_col]))
+            for chart_df, other_col in zip(chart_frames, other_cols)
+        ]
+        chart_pngs = render_charts(chart_jobs)
+        sections = report_future.result()
+        extra_text = extra_future.result() if extra_future else ""
+    detail_sections = sections.get('details') if isinstance(sections.get('details'), dict) else {}
+    
+    # First slide: Only title
+    cover_title = str(sections.get('title') or f"Analysis of {col} vs Others").split('\n')[0]
+    add_title_slide(prs, layouts, cover_title)
+    slide_titles[0] = cover_title
+    
+    # Second slide(s): Overview of upcoming slides
     overview_content = [f"{i + 1}. {title}" for i, title in enumerate(slide_titles[2:-1])]  # Skip title, overview, and Thank You
     max_points_per_slide = 6  # Limit to 6 to fit
     for i in range(0, len(overview_content), max_points_per_slide):
         chunk = overview_content[i:i + max_points_per_slide]
         title = "Overview of Upcoming Slides" if i == 0 else "Overview of Upcoming Slides Continued"
-        add_slide(prs, title, chunk)
+        add_slide(prs, layouts, title, chunk)
     
     # Add introduction slide (always after overview)
-    intro_prompt = f"Introduce analysis of {col} vs others based on CSV with {len(df)} rows, {num_cols} columns, focusing on {col} in 5 to 6 bullet points based on '{user_prompt}'."
-    intro_text = generate_with_llama(intro_prompt)
-    intro_points = split_into_bullets(intro_text)
-    add_slide(prs, "Introduction to Analysis", intro_points)
+    intro_prompt = f"{csv_context}\n\nTASK: Introduce analysis of {col} vs others, focusing on {col}, based on '{user_prompt}'."
+    intro_points = section_to_bullets(sections.get('intro'), intro_prompt, json.dumps([cache_scope, "intro"]), num_ctx)
+    add_slide(prs, layouts, "Introduction to Analysis", intro_points)
     
     # Generate comparison slides with CSV-specific content
-    for idx, other_col in enumerate(other_cols):
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            chart_path = tmp.name
-            plt.figure(figsize=(8, 5))
-            is_numeric_col = pd.api.types.is_numeric_dtype(df[col])
-            is_numeric_other = pd.api.types.is_numeric_dtype(df[other_col])
-            actual_plot_type = plot_type
-            
-            if is_numeric_col and is_numeric_other:
-                if plot_type == "Scatter":
-                    df.plot.scatter(x=col, y=other_col, color='teal', alpha=0.5)
-                    plt.title(f"{col} vs {other_col}", fontsize=12)
-                elif plot_type == "Hexbin":
-                    plt.hexbin(df[col], df[other_col], gridsize=20, cmap='Blues', mincnt=1)
-                    plt.colorbar(label='Count')
-                    plt.title(f"{col} vs {other_col}", fontsize=12)
-                elif plot_type == "Box":
-                    bins = pd.cut(df[col], bins=3)
-                    df_box = df[[other_col]].copy()
-                    df_box['Binned_' + col] = bins
-                    df_box.boxplot(column=other_col, by='Binned_' + col, grid=False, patch_artist=True)
-                    plt.title(f"{other_col} by {col}", fontsize=12)
-                    plt.suptitle('')
-                elif plot_type == "Bar":
-                    bins = pd.cut(df[col], bins=3)
-                    df.groupby(bins)[other_col].mean().plot(kind='bar', color='lightcoral')
-                    plt.title(f"Mean {other_col} by {col}", fontsize=12)
-            elif is_numeric_other:
-                actual_plot_type = "Bar"
-                df.groupby(col)[other_col].mean().plot(kind='bar', color='lightgreen')
-                plt.title(f"Mean {other_col} by {col}", fontsize=12)
-            elif is_numeric_col:
-                actual_plot_type = "Bar"
-                df.groupby(other_col)[col].count().plot(kind='bar', color='lightblue')
-                plt.title(f"Count of {col} by {other_col}", fontsize=12)
-            else:
-                actual_plot_type = "Stacked Bar"
-                pd.crosstab(df[col], df[other_col]).plot(kind='bar', stacked=True, colormap='Set2')
-                plt.title(f"{col} vs {other_col}", fontsize=12)
-            
-            plt.xlabel(col, fontsize=10)
-            plt.ylabel(other_col, fontsize=10)
-            plt.xticks(rotation=45, ha='right', fontsize=8)
-            plt.savefig(chart_path, bbox_inches='tight')
-            plt.close()
+    for other_col, chart_png in zip(other_cols, chart_pngs):
+        stats_content, content_points = comparison_stats[other_col]
         
         # Plot slide (only plot)
-        add_slide(prs, f"Comparison Plot: {col} vs {other_col}", chart_path=chart_path)
+        add_slide(prs, layouts, f"Comparison Plot: {col} vs {other_col}", chart_stream=io.BytesIO(chart_png))
         
         # Content slide (CSV-specific stats)
-        corr = df[[col, other_col]].corr().iloc[0,1] if is_numeric_col and is_numeric_other else "N/A"
-        col_stat_label = "mean" if is_numeric_col else "unique"
-        col_stat_value = f"{df[col].mean():.2f}" if is_numeric_col else str(df[col].nunique())
-        other_col_stat_label = "mean" if is_numeric_other else "unique"
-        other_col_stat_value = f"{df[other_col].mean():.2f}" if is_numeric_other else str(df[other_col].nunique())
-        stats_content = f"{col} vs {other_col}: Corr={corr if corr != 'N/A' else 'N/A'}, {col} {col_stat_label}={col_stat_value}, {other_col} {other_col_stat_label}={other_col_stat_value}"
-        content_points = [
-            f"Rows analyzed: {len(df)}. Total entries in CSV.",
-            f"Correlation: {corr:.2f}. Shows {col} vs {other_col} link." if corr != "N/A" else f"{col} type: {df[col].dtype}. Non-numeric data detected.",
-            f"{other_col} mean: {df[other_col].mean():.2f}. Average from CSV data." if is_numeric_other else f"{other_col} unique: {df[other_col].nunique()}. Distinct values counted.",
-            f"{other_col} min: {df[other_col].min():.2f}. Minimum value in CSV." if is_numeric_other else f"{other_col} top: {df[other_col].mode()[0]}. Most frequent in CSV.",
-            f"{other_col} max: {df[other_col].max():.2f}. Maximum value in CSV." if is_numeric_other else f"{other_col} diversity: {'High' if df[other_col].nunique() > 5 else 'Low'}. Variation in data.",
-            f"{col} stat: {df[col].mean():.2f}. Numeric average from CSV." if is_numeric_col else f"{col} top: {df[col].mode()[0]}. Top category in CSV."
-        ]
-        add_slide(prs, f"Comparison Insights: {col} vs {other_col}", content_points)
+        add_slide(prs, layouts, f"Comparison Insights: {col} vs {other_col}", content_points)
         
         # Detailed insights slide (CSV-specific)
-        detail_prompt = f"Provide detailed insights for {col} vs {other_col} based on CSV data: '{stats_content}', in 5 to 6 bullet points based on '{user_prompt}'."
-        detail_text = generate_with_llama(detail_prompt)
-        detail_points = split_into_bullets(detail_text)
-        add_slide(prs, f"Detailed Insights: {col} vs {other_col}", detail_points)
-        
-        os.remove(chart_path)
+        detail_prompt = f"{csv_context}\n\nTASK: Provide detailed insights for {col} vs {other_col} based on '{stats_content}' and '{user_prompt}'."
+        detail_points = section_to_bullets(detail_sections.get(str(other_col)), detail_prompt, json.dumps([cache_scope, "details", str(other_col)]), num_ctx)
+        add_slide(prs, layouts, f"Detailed Insights: {col} vs {other_col}", detail_points)
     
     # Add index slide if needed
     if extra_slides_needed:
         index_content = [f"{i + 1}. {title}" for i, title in enumerate(slide_titles[2:-1])]  # Skip title, overview, and Thank You
         index_points = split_into_bullets("\n".join(index_content))
-        add_slide(prs, "Index of Slides", index_points)
+        add_slide(prs, layouts, "Index of Slides", index_points)
     
     # Handle user prompt customization
-    if user_prompt and user_prompt.lower() != "default analysis of one column vs others" and "summary" in user_prompt.lower():
-        summary_prompt = f"Summarize analysis of {col} vs others based on CSV data with {len(df)} rows, {num_cols} columns in 5 to 6 bullet points based on '{user_prompt}'."
-        summary_text = generate_with_llama(summary_prompt)
-        summary_points = split_into_bullets(summary_text)
-        add_slide(prs, "Summary of Findings", summary_points)
+    if include_summary:
+        summary_prompt = f"{csv_context}\n\nTASK: Summarize analysis of {col} vs others based on '{user_prompt}'."
+        summary_points = section_to_bullets(sections.get('summary'), summary_prompt, json.dumps([cache_scope, "summary"]), num_ctx)
+        add_slide(prs, layouts, "Summary of Findings", summary_points)
         slide_titles.append("Summary of Findings")
     
-    # Ensure minimum slides by adding extra content slides if needed
-    current_slides = len(slide_titles) + 1  # +1 for Thank You
-    if current_slides < min_slides:
-        for i in range(min_slides - current_slides):
-            extra_prompt = f"Provide extra analysis for {col} vs others based on CSV data with {len(df)} rows, {num_cols} columns in 5 to 6 bullet points based on '{user_prompt}'."
-            extra_text = generate_with_llama(extra_prompt)
-            extra_points = split_into_bullets(extra_text)
-            add_slide(prs, f"Additional Analysis {i + 1}", extra_points)
-            slide_titles.append(f"Additional Analysis {i + 1}")
+    # Extra content slides to reach the minimum: 5 to 6 of the batched bullet points per slide,
+    # asking LLaMA for each slide alone when the batched response ran short
+    extra_lines = [line.strip() for line in extra_text.split('\n') if line.strip()]
+    per_slide = min(6, max(5, len(extra_lines) // max(extra_slide_count, 1)))
+    extra_chunks = [extra_lines[i * per_slide:(i + 1) * per_slide] for i in range(extra_slide_count)]
+    short_slides = [i for i, chunk in enumerate(extra_chunks) if len(chunk) < 5]
+    if short_slides:
+        with ThreadPoolExecutor() as llm_pool:
+            refills = {
+                i: llm_pool.submit(generate_with_llama, f"{csv_context}\n\nTASK: Provide additional analysis part {i + 1} of {extra_slide_count} for {col} vs others based on '{user_prompt}'.", json.dumps([cache_scope, "extra", i + 1]), num_ctx)
+                for i in short_slides
+            }
+            for i, future in refills.items():
+                extra_chunks[i] = future.result().split('\n')
+    for i, chunk in enumerate(extra_chunks):
+        extra_points = split_into_bullets("\n".join(chunk))
+        add_slide(prs, layouts, f"Additional Analysis {i + 1}", extra_points)
+        slide_titles.append(f"Additional Analysis {i + 1}")
     
     # Second-to-last slide: Conclusion (CSV-specific)
-    conclusion_prompt = f"Conclude analysis of {col} vs others based on CSV data with {len(df)} rows, {num_cols} columns in 5 to 6 bullet points based on '{user_prompt}'."
-    conclusion_text = generate_with_llama(conclusion_prompt)
-    conclusion_points = split_into_bullets(conclusion_text)
-    add_slide(prs, "Conclusion of Analysis", conclusion_points)
+    conclusion_prompt = f"{csv_context}\n\nTASK: Conclude analysis of {col} vs others based on '{user_prompt}'."
+    conclusion_points = section_to_bullets(sections.get('conclusion'), conclusion_prompt, json.dumps([cache_scope, "conclusion"]), num_ctx)
+    add_slide(prs, layouts, "Conclusion of Analysis", conclusion_points)
     
     # Last slide: Thank You (only text, centered)
-    title_slide_layout = prs.slide_layouts[0]
-    slide = prs.slides.add_slide(title_slide_layout)
-    slide.background.fill.solid()
-    slide.background.fill.fore_color.rgb = RGBColor(240, 248, 255)
-    title = slide.shapes.title
-    title.text = "Thank You"
-    title.text_frame.paragraphs[0].font.size = Pt(32)
-    title.text_frame.paragraphs[0].font.color.rgb = RGBColor(0, 51, 102)
-    title.top = Inches(3)
-    title.left = Inches(1)
-    title.width = Inches(8)
-    for shape in slide.shapes:
-        if shape.placeholder_format.idx != 0:
-            shape.element.getparent().remove(shape.element)
+    add_title_slide(prs, layouts, "Thank You")
     
-    # Save and convert
-    pptx_file = "one_column_eda_report.pptx"
-    odp_file = "one_column_eda_report.odp"
-    prs.save(pptx_file)
-    try:
-        subprocess.run(["libreoffice", "--headless", "--convert-to", "odp", pptx_file], check=True)
-        with open(odp_file, "rb") as f:
-            odp_bytes = f.read()
-        os.remove(pptx_file)
-        os.remove(odp_file)
-        return True, odp_bytes
-    except Exception as e:
-        return False, f"Error converting to ODP: {str(e)}"
+    # Save in memory and return the .pptx bytes
+    buf = io.BytesIO()
+    prs.save(buf)
+    return True, buf.getvalue()
+
+# Function to get the chart worker pool, created once per server so workers (and their figures) are reused across reports;
+# workers are spawned rather than forked because forking the multi-threaded server can copy held locks into the child
+@st.cache_resource(show_spinner=False)
+def get_chart_pool():
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+
+# Function to render charts on the shared pool, rebuilding it once if a worker died and left it broken
+def render_charts(chart_jobs):
+    for attempt in range(2):
+        chart_pool = get_chart_pool()
+        try:
+            futures = [chart_pool.submit(charts.render_chart, *job) for job in chart_jobs]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            if attempt:
+                raise
+            chart_pool.shutdown(wait=False)
+            get_chart_pool.clear()  # The next get_chart_pool() call spawns fresh workers
+
+# Function to load the models in the background once per server so the first report skips the cold start
+@st.cache_resource(show_spinner=False)
+def warm_up_llama():
+    def load_models():
+        try:
+            ollama.generate(model=LLM_MODEL, prompt="ok", keep_alive=LLM_KEEP_ALIVE, options={**LLM_OPTIONS, "num_predict": 1})  # Same num_ctx as a typical report, so the runner is not reloaded
+            ollama.embeddings(model=EMBED_MODEL, prompt="ok", keep_alive=LLM_KEEP_ALIVE)
+        except Exception:
+            pass  # Reports still work; the first call just pays the load time
+    thread = threading.Thread(target=load_models, daemon=True)
+    thread.start()
+    return thread
+
+# Function to parse an uploaded CSV, cached on its contents so reruns and re-uploads skip parsing
+@st.cache_data(show_spinner=False)
+def load_csv(file_bytes):
+    df = pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
+    # The pyarrow engine keeps duplicate and blank headers as-is; the C engine renames them (score.1, Unnamed: 2)
+    if df.columns.duplicated().any() or (df.columns == '').any():
+        return pd.read_csv(io.BytesIO(file_bytes))
+    # The pyarrow engine reads columns with no values as object (all None); restore the C engine's all-NaN float64
+    empty_cols = list(df.columns[df.isna().all().to_numpy()])
+    if empty_cols:
+        df[empty_cols] = df[empty_cols].astype('float64')
+    return df
 
 # Streamlit front-end
 def main():
     st.title("AI Based PPT Generator")
     st.markdown("Upload a CSV, select one column, choose a plot type, set minimum slides, and optionally provide a prompt.")
     
+    warm_up_llama()
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
     
     if uploaded_file:
-        uploaded_file.seek(0)
         try:
-            df = pd.read_csv(uploaded_file)
+            df = load_csv(uploaded_file.getvalue())
             if df.empty:
                 st.error("CSV file is empty.")
                 return
@@ -291,14 +511,14 @@ def main():
         
         if st.button("Generate Report"):
             with st.spinner("Generating report with LLaMA..."):
-                success, result = generate_eda_report(uploaded_file, col, plot_type, min_slides, user_prompt)
+                success, result = generate_eda_report(df, col, plot_type, min_slides, user_prompt)
                 if success:
                     st.success("Report generated successfully!")
                     st.download_button(
                         label="Download EDA Report",
                         data=result,
-                        file_name="one_column_eda_report.odp",
-                        mime="application/vnd.oasis.opendocument.presentation"
+                        file_name="one_column_eda_report.pptx",
+                        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
                     )
                 else:
                     st.error(f"Error: {result}")